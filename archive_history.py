@@ -0,0 +1,111 @@
+import pandas as pd
+import configparser
+from sqlalchemy import create_engine, text
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import os
+import shutil
+import logging
+import history_archive
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    db_config = config['database']
+except Exception as e:
+    logging.error(f"Erreur de lecture de config.ini: {e}")
+    exit()
+
+# Section [archive] de config.ini : horizon_jours (défaut 365), repertoire (défaut 'archive')
+REPERTOIRE_ARCHIVE, HORIZON_JOURS = history_archive.lire_config_archive(os.getcwd())
+TAILLE_LOT_SUPPRESSION = 1000
+
+aujourd_hui = datetime.now(ZoneInfo("America/Montreal")).date()
+date_limite = history_archive.date_limite_archivage(aujourd_hui, HORIZON_JOURS)
+
+logging.info(f"--- Début de l'archivage de l'historique (relevés antérieurs au {date_limite}) ---")
+
+manifeste_publie = False
+try:
+    # 0. Supprimer les versions de partition rendues obsolètes par l'exécution précédente.
+    # Elles ne sont plus référencées par le manifeste ; on les garde une exécution de plus
+    # pour les requêtes Flask qui lisaient encore l'ancien manifeste.
+    manifeste = history_archive.lire_manifeste(REPERTOIRE_ARCHIVE)
+    for dossier in manifeste.get('obsoletes', []):
+        shutil.rmtree(os.path.join(REPERTOIRE_ARCHIVE, dossier), ignore_errors=True)
+    manifeste['obsoletes'] = []
+
+    connection_string = f"mysql+mysqlconnector://{db_config['user']}:{db_config['password']}@{db_config['host']}/{db_config['database']}"
+    engine = create_engine(connection_string)
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+
+        # 1. Lire les relevés à archiver
+        select_stmt = text("""
+            SELECT id, titre_id, date_releve, valeur, quantite, devise
+            FROM historique WHERE date_releve < :limite
+        """)
+        df = pd.read_sql(select_stmt, conn, params={'limite': date_limite})
+
+        if df.empty:
+            logging.info("Aucun relevé à archiver.")
+            history_archive.ecrire_manifeste(REPERTOIRE_ARCHIVE, manifeste)
+        else:
+            df['date_releve'] = pd.to_datetime(df['date_releve']).dt.normalize()
+            df['devise'] = df['devise'].fillna('USD')
+            logging.info(f"{len(df)} relevés à archiver.")
+
+            # 2. Écrire une nouvelle version de chaque partition mensuelle concernée
+            anciens_dossiers = []
+            for mois, groupe in df.groupby(df['date_releve'].dt.strftime('%Y-%m')):
+                entree = manifeste['partitions'].get(mois)
+                if entree:
+                    # Fusion avec la partition existante (ex. relevés réinsérés par backfill_history.py
+                    # après le retrait des anciens relevés de l'archive)
+                    existant = pd.DataFrame({nom: col[:] for nom, col in history_archive.charger_partition(REPERTOIRE_ARCHIVE, entree).items()})
+                    groupe = pd.concat([existant, groupe], ignore_index=True)
+                    anciens_dossiers.append(entree['dossier'])
+
+                # Un seul relevé par titre et par date ; la base fait foi
+                groupe = groupe.drop_duplicates(subset=['titre_id', 'date_releve'], keep='last')
+                groupe = groupe.sort_values(['titre_id', 'date_releve'])
+                colonnes = {
+                    'titre_id': groupe['titre_id'].to_numpy(),
+                    'date_releve': groupe['date_releve'].to_numpy().astype('datetime64[D]'),
+                    'valeur': groupe['valeur'].to_numpy(),
+                    'quantite': groupe['quantite'].to_numpy(),
+                    'devise': groupe['devise'].to_numpy(),
+                }
+                version = history_archive.prochaine_version(manifeste, mois)
+                manifeste['partitions'][mois] = history_archive.ecrire_partition(REPERTOIRE_ARCHIVE, mois, colonnes, version)
+                logging.info(f"Partition {mois} écrite ({len(groupe)} relevés).")
+
+            # 3. Publier les partitions ; les anciennes versions seront supprimées à la prochaine exécution
+            manifeste['obsoletes'] = anciens_dossiers
+            history_archive.ecrire_manifeste(REPERTOIRE_ARCHIVE, manifeste)
+            manifeste_publie = True
+
+            # 4. Supprimer de la base les relevés désormais archivés.
+            # Publier avant de supprimer est sans risque : si la suppression échoue, les relevés
+            # existent des deux côtés et history_archive fait primer la base (pas de double comptage).
+            ids = df['id'].tolist()
+            delete_stmt = text("DELETE FROM historique WHERE id IN :ids")
+            for i in range(0, len(ids), TAILLE_LOT_SUPPRESSION):
+                conn.execute(delete_stmt, {'ids': tuple(ids[i:i + TAILLE_LOT_SUPPRESSION])})
+            logging.info(f"{len(ids)} relevés supprimés de la base de données.")
+
+        trans.commit()
+        logging.info("Transaction terminée.")
+
+except Exception as e:
+    logging.error(f"Une erreur majeure est survenue : {e}", exc_info=True)
+    if manifeste_publie:
+        logging.error("ATTENTION : les partitions sont publiées mais les relevés archivés n'ont pas été supprimés de la base. "
+                      "Relancez archive_history.py pour terminer l'archivage.")
+
+logging.info("--- Archivage de l'historique terminé ---")
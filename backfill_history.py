@@ -6,6 +6,7 @@ import os
 import logging
 import re
 import yfinance as yf
+import history_archive
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -104,6 +105,16 @@ try:
         trans.commit()
         logging.info("Transaction terminée.")
 
+    # 9. Retirer les mêmes relevés des mois déjà archivés (archive_history.py), sinon les
+    # dates non renvoyées par yfinance garderaient leurs anciennes valeurs archivées
+    try:
+        repertoire_archive, _ = history_archive.lire_config_archive(os.getcwd())
+        retires = history_archive.retirer_releves_depuis(repertoire_archive, START_DATE)
+        logging.info(f"{retires} relevés archivés à partir du {START_DATE} retirés de l'archive.")
+    except Exception as archive_error:
+        logging.error(f"ATTENTION : l'archive n'a pas pu être mise à jour ({archive_error}). "
+                      f"Des relevés archivés à partir du {START_DATE} peuvent subsister ; relancez backfill_history.py.", exc_info=True)
+
 except Exception as e:
     logging.error(f"Une erreur majeure est survenue : {e}", exc_info=True)
 
@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 import locale
 from collections import namedtuple
 from zoneinfo import ZoneInfo
+import history_archive
 
 # --- Configuration du Français pour les dates ---
 try:
@@ -33,6 +34,9 @@ login_manager.login_view = 'login'
 login_manager.login_message = "Veuillez vous connecter pour accéder à cette page."
 login_manager.login_message_category = "info"
 
+# Relevés anciens déplacés hors de MySQL par archive_history.py
+REPERTOIRE_ARCHIVE, _ = history_archive.lire_config_archive(os.path.dirname(os.path.abspath(__file__)))
+
 
 # --- MODÈLES DE BASE DE DONNÉES ---
 class User(db.Model, UserMixin):
@@ -63,6 +67,11 @@ class Historique(db.Model):
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+def historique_complet(titre):
+    manifeste = history_archive.lire_manifeste(REPERTOIRE_ARCHIVE)
+    archives = history_archive.releves_archives_par_titre(REPERTOIRE_ARCHIVE, manifeste, [titre.id]).get(titre.id, [])
+    return history_archive.fusionner_historique(archives, titre.historique)
+
 
 # --- ROUTES DE CONNEXION / DÉCONNEXION ---
 @app.route('/login', methods=['GET', 'POST'])
@@ -101,8 +110,7 @@ def index():
 def titre_detail(titre_id):
     try:
         titre = Titre.query.get_or_404(titre_id)
-        historique_valide = [h for h in titre.historique if h.date_releve]
-        historique_trie = sorted(historique_valide, key=lambda h: h.date_releve)
+        historique_trie = historique_complet(titre)
 
         performance = None
         if len(historique_trie) >= 2:
@@ -115,7 +123,7 @@ def titre_detail(titre_id):
 
         labels = [h.date_releve.strftime('%d %B %Y') for h in historique_trie]
         valeurs = [h.valeur for h in historique_trie]
-        return render_template('titre_detail.html', titre=titre, labels=labels, valeurs=valeurs, performance=performance)
+        return render_template('titre_detail.html', titre=titre, historique=historique_trie, labels=labels, valeurs=valeurs, performance=performance)
     except Exception as e:
         return f"<h1>Une erreur est survenue sur la page de détail.</h1><p>Détails :<br>{e}</p>"
 
@@ -128,8 +136,12 @@ def dashboard():
         config.read(config_path)
         usd_to_cad_rate = config.getfloat('settings', 'usd_to_cad_rate', fallback=1.35)
 
-        valeur_par_date_cad = {}
+        tous_les_titres = Titre.query.all()
         historiques = Historique.query.all()
+        # Un seul manifeste par requête ; les couples (titre, date) en base priment sur l'archive
+        manifeste = history_archive.lire_manifeste(REPERTOIRE_ARCHIVE)
+        releves_en_base = {(h.titre_id, h.date_releve) for h in historiques if h.date_releve}
+        valeur_par_date_cad = history_archive.valeur_par_date_archives(REPERTOIRE_ARCHIVE, manifeste, [t.id for t in tous_les_titres], releves_en_base, usd_to_cad_rate)
         for h in historiques:
             if not h.date_releve:
                 continue
@@ -153,11 +165,16 @@ def dashboard():
                 variation_pourcentage = (variation_absolue / avant_derniere_valeur) * 100
                 performance_globale = {"valeur_actuelle": derniere_valeur, "absolue": variation_absolue, "pourcentage": variation_pourcentage, "devise": "CAD"}
 
+        # L'archive n'est lue que pour les titres ayant moins de deux relevés en base, en un seul passage
+        titres_a_completer = [t.id for t in tous_les_titres if len([h for h in t.historique if h.date_releve]) < 2]
+        archives_par_titre = history_archive.releves_archives_par_titre(REPERTOIRE_ARCHIVE, manifeste, titres_a_completer)
+
         performances_individuelles = []
-        tous_les_titres = Titre.query.all()
         for titre in tous_les_titres:
             historique_valide = [h for h in titre.historique if h.date_releve]
             historique_trie = sorted(historique_valide, key=lambda h: h.date_releve)
+            if titre.id in archives_par_titre:
+                historique_trie = history_archive.fusionner_historique(archives_par_titre[titre.id], titre.historique)
             if len(historique_trie) >= 2:
                 dernier = historique_trie[-1]
                 avant_dernier = historique_trie[-2]
@@ -176,10 +193,11 @@ def dashboard():
         top_10_haut = []
         top_10_bas = []
         titres_avec_donnees = []
-        tous_les_titres = Titre.query.all()
 
         for titre in tous_les_titres:
             dernier_releve = db.session.query(Historique).filter_by(titre_id=titre.id).order_by(Historique.date_releve.desc()).first()
+            if not dernier_releve and archives_par_titre.get(titre.id):
+                dernier_releve = archives_par_titre[titre.id][-1]
             # On vérifie que le titre a bien les données an_haut/an_bas (elles peuvent être None)
             if dernier_releve and hasattr(titre, 'an_haut') and hasattr(titre, 'an_bas'):
                 titre.prix_actuel = dernier_releve.valeur
@@ -274,4 +292,4 @@ def demo_titre_detail(ticker):
         dernier, avant_dernier = historique_trie[-1], historique_trie[-2]
         if avant_dernier.valeur != 0:
             performance = {"absolue": dernier.valeur - avant_dernier.valeur, "pourcentage": ((dernier.valeur - avant_dernier.valeur) / avant_dernier.valeur) * 100}
-    return render_template('titre_detail.html', titre=titre, labels=labels, valeurs=valeurs, performance=performance)
\ No newline at end of file
+    return render_template('titre_detail.html', titre=titre, historique=historique_trie, labels=labels, valeurs=valeurs, performance=performance)
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+import json
+import shutil
+import configparser
+from collections import namedtuple
+from datetime import date
+import numpy as np
+
+# --- Format des partitions d'archive ---
+# Chaque mois archivé est un dossier de fichiers .npy (une colonne par fichier),
+# référencé dans manifest.json. Les colonnes sont lues en mémoire mappée.
+# Les lignes sont triées par (titre_id, date_releve) : les relevés d'un titre
+# sont contigus et se retrouvent par recherche dichotomique.
+COLONNES = {
+    'titre_id': 'int64',
+    'date_releve': 'datetime64[D]',
+    'valeur': 'float64',
+    'quantite': 'float64',
+    'devise': '<U3',
+}
+NOM_MANIFESTE = 'manifest.json'
+HORIZON_JOURS_DEFAUT = 365
+REPERTOIRE_DEFAUT = 'archive'
+
+ReleveArchive = namedtuple('ReleveArchive', ['titre_id', 'date_releve', 'valeur', 'quantite', 'devise'])
+
+
+def lire_config_archive(base_dir):
+    """Retourne (répertoire d'archive, horizon en jours) depuis la section [archive] de config.ini."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(base_dir, 'config.ini'))
+    repertoire = config.get('archive', 'repertoire', fallback=REPERTOIRE_DEFAUT)
+    horizon_jours = config.getint('archive', 'horizon_jours', fallback=HORIZON_JOURS_DEFAUT)
+    return os.path.join(base_dir, repertoire), horizon_jours
+
+
+def lire_manifeste(repertoire):
+    chemin = os.path.join(repertoire, NOM_MANIFESTE)
+    if not os.path.exists(chemin):
+        return {'partitions': {}, 'obsoletes': [], 'versions': {}}
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ecrire_manifeste(repertoire, manifeste):
+    # Écriture atomique : un lecteur voit soit l'ancien manifeste, soit le nouveau
+    os.makedirs(repertoire, exist_ok=True)
+    chemin = os.path.join(repertoire, NOM_MANIFESTE)
+    chemin_tmp = chemin + '.tmp'
+    with open(chemin_tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifeste, f, indent=2, sort_keys=True)
+    os.replace(chemin_tmp, chemin)
+
+
+def charger_partition(repertoire, entree):
+    """Ouvre les colonnes d'une partition en mémoire mappée (lecture seule)."""
+    dossier = os.path.join(repertoire, entree['dossier'])
+    return {nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode='r') for nom in COLONNES}
+
+
+def prochaine_version(manifeste, mois):
+    # Conservée même si la partition disparaît, pour ne jamais réutiliser un dossier obsolète
+    versions = manifeste.setdefault('versions', {})
+    versions[mois] = max(versions.get(mois, 0), manifeste['partitions'].get(mois, {}).get('version', 0)) + 1
+    return versions[mois]
+
+
+def ecrire_partition(repertoire, mois, colonnes, version):
+    """Écrit une nouvelle version de la partition du mois et retourne son entrée de manifeste.
+
+    Chaque version a son propre dossier : la partition n'est visible qu'une fois
+    le manifeste mis à jour. L'ancienne version est listée dans manifeste['obsoletes']
+    et n'est supprimée qu'à l'exécution suivante, pour les lecteurs de l'ancien manifeste.
+    """
+    nom_dossier = f"{mois}.v{version}"
+    dossier = os.path.join(repertoire, nom_dossier)
+    if os.path.exists(dossier):
+        shutil.rmtree(dossier)
+    os.makedirs(dossier)
+    for nom, dtype in COLONNES.items():
+        np.save(os.path.join(dossier, f"{nom}.npy"), np.asarray(colonnes[nom], dtype=dtype))
+    dates = np.asarray(colonnes['date_releve'], dtype='datetime64[D]')
+    return {
+        'dossier': nom_dossier,
+        'version': version,
+        'lignes': int(len(dates)),
+        'date_min': str(dates.min()),
+        'date_max': str(dates.max()),
+    }
+
+
+def _partitions(repertoire, manifeste):
+    for mois in sorted(manifeste['partitions']):
+        yield charger_partition(repertoire, manifeste['partitions'][mois])
+
+
+def _cles(titre_ids, dates):
+    # Clé entière unique par (titre, date) pour filtrer avec np.isin
+    jours = np.asarray(dates, dtype='datetime64[D]').astype('int64')
+    return np.asarray(titre_ids, dtype='int64') * 1_000_000 + jours
+
+
+def releves_archives_par_titre(repertoire, manifeste, titre_ids):
+    """Relevés archivés des titres demandés, en un seul passage : {titre_id: [ReleveArchive]} triés par date.
+
+    Seules les tranches des titres demandés sont lues (np.searchsorted sur la colonne titre_id).
+    """
+    par_titre = {}
+    ids = np.unique(np.asarray(list(titre_ids), dtype='int64'))
+    if not len(ids):
+        return par_titre
+    # Les partitions sont parcourues par mois croissant : chaque liste reste triée par date
+    for colonnes in _partitions(repertoire, manifeste):
+        debuts = np.searchsorted(colonnes['titre_id'], ids, side='left')
+        fins = np.searchsorted(colonnes['titre_id'], ids, side='right')
+        for titre_id, debut, fin in zip(ids.tolist(), debuts.tolist(), fins.tolist()):
+            if debut == fin:
+                continue
+            lignes = zip(
+                colonnes['date_releve'][debut:fin].astype(object),
+                colonnes['valeur'][debut:fin].tolist(),
+                colonnes['quantite'][debut:fin].tolist(),
+                colonnes['devise'][debut:fin].tolist(),
+            )
+            par_titre.setdefault(titre_id, []).extend(ReleveArchive(titre_id, *ligne) for ligne in lignes)
+    return par_titre
+
+
+def fusionner_historique(releves_archives, historique_en_base):
+    """Fusionne relevés archivés et relevés en base, triés par date.
+
+    Une date peut exister des deux côtés (backfill dans un mois archivé, ou
+    archivage interrompu avant la suppression en base) : la base fait foi.
+    """
+    historique_valide = [h for h in historique_en_base if h.date_releve]
+    dates_en_base = {h.date_releve for h in historique_valide}
+    archives = [r for r in releves_archives if r.date_releve not in dates_en_base]
+    return sorted(archives + historique_valide, key=lambda h: h.date_releve)
+
+
+def valeur_par_date_archives(repertoire, manifeste, titre_ids, releves_en_base, usd_to_cad_rate):
+    """Valeur totale (CAD) du portefeuille par date sur les partitions archivées.
+
+    Seuls les titres encore présents en base (titre_ids) sont comptés, comme pour la table historique.
+    Les couples (titre_id, date_releve) de releves_en_base sont ignorés : la base fait foi.
+    """
+    valeur_par_date = {}
+    ids = np.asarray(list(titre_ids), dtype='int64')
+    if releves_en_base:
+        titres_en_base, dates_en_base = zip(*releves_en_base)
+        cles_en_base = _cles(titres_en_base, dates_en_base)
+    else:
+        cles_en_base = np.empty(0, dtype='int64')
+    for colonnes in _partitions(repertoire, manifeste):
+        masque = np.isin(colonnes['titre_id'], ids)
+        masque &= ~np.isin(_cles(colonnes['titre_id'], colonnes['date_releve']), cles_en_base)
+        if not masque.any():
+            continue
+        valeurs = colonnes['valeur'][masque] * colonnes['quantite'][masque]
+        valeurs = np.where(colonnes['devise'][masque] == 'USD', valeurs * usd_to_cad_rate, valeurs)
+        dates, inverse = np.unique(colonnes['date_releve'][masque], return_inverse=True)
+        sommes = np.bincount(inverse, weights=valeurs, minlength=len(dates))
+        for d, somme in zip(dates.astype(object), sommes.tolist()):
+            valeur_par_date[d] = valeur_par_date.get(d, 0) + somme
+    return valeur_par_date
+
+
+def retirer_releves_depuis(repertoire, date_debut):
+    """Retire de l'archive les relevés datés de date_debut ou après et retourne leur nombre.
+
+    Pendant de backfill_history.py, qui remplace l'historique à partir d'une date en base.
+    Les anciennes versions sont listées dans manifeste['obsoletes'], comme pour l'archivage.
+    """
+    manifeste = lire_manifeste(repertoire)
+    limite = np.datetime64(date_debut, 'D')
+    retires = 0
+    for mois, entree in sorted(manifeste['partitions'].items()):
+        if np.datetime64(entree['date_max'], 'D') < limite:
+            continue
+        colonnes = charger_partition(repertoire, entree)
+        garder = colonnes['date_releve'] < limite
+        retires += int((~garder).sum())
+        manifeste.setdefault('obsoletes', []).append(entree['dossier'])
+        if garder.any():
+            version = prochaine_version(manifeste, mois)
+            manifeste['partitions'][mois] = ecrire_partition(repertoire, mois, {nom: col[garder] for nom, col in colonnes.items()}, version)
+        else:
+            prochaine_version(manifeste, mois)
+            del manifeste['partitions'][mois]
+    if retires:
+        ecrire_manifeste(repertoire, manifeste)
+    return retires
+
+
+def date_limite_archivage(aujourd_hui, horizon_jours):
+    """Premier jour du mois contenant (aujourd'hui - horizon) : seuls des mois complets sont archivés."""
+    limite = date.fromordinal(aujourd_hui.toordinal() - horizon_jours)
+    return limite.replace(day=1)